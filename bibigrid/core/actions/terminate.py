@@ -10,7 +10,8 @@ from datetime import datetime
 
 import yaml
 
-from bibigrid.core.utility.paths.basic_path import CLUSTER_INFO_FOLDER, CLUSTER_MEMORY_PATH, KEY_FOLDER
+from bibigrid.core.utility.paths.basic_path import CLUSTER_INFO_FOLDER, CLUSTER_MEMORY_PATH, \
+    CLUSTER_MEMORY_CACHE_PATH, KEY_FOLDER
 from bibigrid.core.utility.statics.create_statics import DEFAULT_SECURITY_GROUP_NAME, WIREGUARD_SECURITY_GROUP_NAME, \
     KEY_NAME, AC_NAME
 from bibigrid.models.exceptions import ConflictException
@@ -21,6 +22,11 @@ def write_cluster_state(state):
     state["last_changed"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     with open(CLUSTER_MEMORY_PATH, mode="w+", encoding="UTF-8") as cluster_memory_file:
         yaml.safe_dump(data=state, stream=cluster_memory_file)
+    # invalidate the cluster_id cache; it is rebuilt on the next read of the cluster memory file
+    try:
+        os.remove(CLUSTER_MEMORY_CACHE_PATH)
+    except FileNotFoundError:
+        pass
     # all clusters
     cluster_info_path = os.path.normpath(os.path.join(CLUSTER_INFO_FOLDER, f"{state['cluster_id']}.yaml"))
     if not cluster_info_path.startswith(CLUSTER_INFO_FOLDER):
@@ -1,9 +1,13 @@
 """
 Contains main method. Interprets command line, sets logging and starts corresponding action.
 """
+import atexit
+import json
 import logging
-import math
+import logging.handlers
 import os
+import queue
+import signal
 import sys
 import time
 import traceback
@@ -11,18 +15,62 @@ import traceback
 import click
 import yaml
 
-from bibigrid.core.actions import check, create, ide, list_clusters, terminate, update, version
+from bibigrid.core.actions import version
 from bibigrid.core.utility import id_generation
-from bibigrid.core.utility.handler import configuration_handler, provider_handler
-from bibigrid.core.utility.paths.basic_path import CONFIG_FOLDER, CLUSTER_MEMORY_PATH, ENFORCED_CONFIG_PATH, \
-    DEFAULT_CONFIG_PATH
+from bibigrid.core.utility.handler import configuration_handler
+from bibigrid.core.utility.paths.basic_path import CONFIG_FOLDER, CLUSTER_MEMORY_PATH, CLUSTER_MEMORY_CACHE_PATH, \
+    ENFORCED_CONFIG_PATH, DEFAULT_CONFIG_PATH
 
 FOLDER_START = ("~/", "/", "./")
 
 VERBOSITY_LIST = [logging.WARNING, logging.INFO, logging.DEBUG]
 LOGGER_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+LOG_FILE = "bibigrid.log"
 LOG = logging.getLogger("bibigrid")
-logging.addLevelName(42, "PRINT")
+PRINT_LEVEL = 42
+logging.addLevelName(PRINT_LEVEL, "PRINT")
+
+# use the LibYAML bindings if PyYAML was built with them
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)  # pylint: disable=invalid-name
+# the cluster memory file only holds a small cluster state; anything larger is not parsed
+MAX_CLUSTER_MEMORY_SIZE = 65536
+# cluster_id read from the cluster memory file, keyed by the file's path, mtime and size
+_CID_CACHE = {}
+
+
+def read_cluster_id_cache(mem_stat):
+    """
+    Reads the cluster_id from the json cache of the cluster memory file.
+    @param mem_stat: stat result of the cluster memory file
+    @return: cluster_id. If the cache is missing, invalid or was written for another version of the cluster memory
+    file, it returns none.
+    """
+    try:
+        with open(CLUSTER_MEMORY_CACHE_PATH, mode="r", encoding="UTF-8") as cluster_memory_cache_file:
+            cache_dict = json.load(cluster_memory_cache_file)
+        if (cache_dict.get("mtime_ns"), cache_dict.get("size")) != (mem_stat.st_mtime_ns, mem_stat.st_size):
+            return None
+        return cache_dict.get("cluster_id")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def write_cluster_id_cache(cluster_id, mem_stat):
+    """
+    Atomically writes the cluster_id to the json cache of the cluster memory file. The cache stores mtime and size of
+    the cluster memory file it was read from and is only valid for exactly that version.
+    @param cluster_id: cluster_id read from the cluster memory file
+    @param mem_stat: stat result of the cluster memory file the cluster_id was read from
+    @return:
+    """
+    tmp_cache_path = CLUSTER_MEMORY_CACHE_PATH + ".tmp"
+    try:
+        with open(tmp_cache_path, mode="w", encoding="UTF-8") as cluster_memory_cache_file:
+            json.dump({"cluster_id": cluster_id, "mtime_ns": mem_stat.st_mtime_ns, "size": mem_stat.st_size},
+                      cluster_memory_cache_file)
+        os.replace(tmp_cache_path, CLUSTER_MEMORY_CACHE_PATH)
+    except OSError as exc:
+        LOG.debug("Couldn't write cluster memory cache %s: %s", CLUSTER_MEMORY_CACHE_PATH, exc)
 
 
 def get_cluster_id_from_mem():
@@ -32,14 +80,32 @@ def get_cluster_id_from_mem():
     @return: cluster_id. If no mem file can be found, the file is not a valid yaml file or doesn't contain a cluster_id,
     it returns none.
     """
-    if os.path.isfile(CLUSTER_MEMORY_PATH):
-        try:
-            with open(CLUSTER_MEMORY_PATH, mode="r", encoding="UTF-8") as cluster_memory_file:
-                mem_dict = yaml.safe_load(stream=cluster_memory_file)
-                return mem_dict.get("cluster_id")
-        except yaml.YAMLError as exc:
-            LOG.warning("Couldn't read configuration %s: %s", CLUSTER_MEMORY_PATH, exc)
-    LOG.warning(f"Couldn't find cluster memory path {CLUSTER_MEMORY_PATH}")
+    try:
+        # binary mode: the yaml loader detects the encoding itself
+        with open(CLUSTER_MEMORY_PATH, mode="rb") as cluster_memory_file:
+            mem_stat = os.fstat(cluster_memory_file.fileno())
+            if mem_stat.st_size > MAX_CLUSTER_MEMORY_SIZE:
+                LOG.warning("Cluster memory file %s is too large (%s bytes). Ignoring it.", CLUSTER_MEMORY_PATH,
+                            mem_stat.st_size)
+                return None
+            cache_key = (CLUSTER_MEMORY_PATH, mem_stat.st_mtime_ns, mem_stat.st_size)
+            if _CID_CACHE.get("key") == cache_key:
+                return _CID_CACHE["val"]
+            cluster_id = read_cluster_id_cache(mem_stat)
+            if not cluster_id:
+                mem_dict = yaml.load(cluster_memory_file.read(mem_stat.st_size), Loader=YAML_LOADER)
+                cluster_id = mem_dict.get("cluster_id")
+                if cluster_id:
+                    write_cluster_id_cache(cluster_id, mem_stat)
+        _CID_CACHE["key"] = cache_key
+        _CID_CACHE["val"] = cluster_id
+        return cluster_id
+    except FileNotFoundError:
+        LOG.warning("Couldn't find cluster memory path %s", CLUSTER_MEMORY_PATH)
+    except OSError as exc:
+        LOG.warning("Couldn't open cluster memory path %s: %s", CLUSTER_MEMORY_PATH, exc)
+    except yaml.YAMLError as exc:
+        LOG.warning("Couldn't read configuration %s: %s", CLUSTER_MEMORY_PATH, exc)
     return None
 
 
@@ -53,9 +119,113 @@ def set_logger_verbosity(verbosity):
     capped_verbosity = min(verbosity, len(VERBOSITY_LIST) - 1)
     # LOG.basicConfig(format=LOGGER_FORMAT, level=VERBOSITY_LIST[capped_verbosity],
     #                    handlers=LOGGING_HANDLER_LIST)
+    # the level is set on the logger, not on the handlers, so disabled records are dropped before they are created
     LOG.setLevel(VERBOSITY_LIST[capped_verbosity])
 
-    LOG.debug(f"Logging verbosity set to {capped_verbosity}")
+    LOG.debug("Logging verbosity set to %s", capped_verbosity)
+
+
+class LogFormatter(logging.Formatter):
+    """
+    Formatter for LOGGER_FORMAT. Builds the line directly instead of %-formatting the record's __dict__.
+    """
+
+    def __init__(self):
+        super().__init__(LOGGER_FORMAT)
+
+    def format(self, record):
+        record.message = record.getMessage()
+        line = f"{self.formatTime(record)} [{record.levelname}] {record.message}"
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line = f"{line}\n{record.exc_text}"
+        if record.stack_info:
+            line = f"{line}\n{self.formatStack(record.stack_info)}"
+        return line
+
+
+def is_warning_record(record):
+    """
+    Returns whether record is a warning or an error. PRINT records have a level above ERROR, but are regular output.
+    @param record: log record
+    @return: True if record is a warning or an error
+    """
+    return record.levelno >= logging.WARNING and record.levelno != PRINT_LEVEL
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """
+    FileHandler that writes through a block buffer. StreamHandler flushes after every record; this handler only
+    flushes on warnings and errors (not on PRINT records) and leaves everything else to the buffer and to close.
+    """
+
+    def __init__(self, filename, buffer_size=65536):
+        self.buffer_size = buffer_size
+        super().__init__(filename, encoding="UTF-8")
+
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=self.buffer_size,  # pylint: disable=consider-using-with
+                    encoding=self.encoding, errors=self.errors)
+
+    def emit(self, record):
+        # reopen like FileHandler.emit if the stream was closed or opening was delayed
+        if self.stream is None:
+            if self.mode != "w" or not self._closed:
+                self.stream = self._open()
+            if self.stream is None:
+                return
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            if is_warning_record(record):
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.handleError(record)
+
+
+def exit_on_signal(caught_signal, frame):  # pylint: disable=unused-argument
+    """
+    Is called when the process is asked to terminate. Exits via SystemExit, so atexit handlers drain the log queue
+    and the log file is flushed.
+    @param caught_signal:
+    @param frame:
+    @return:
+    """
+    sys.exit(128 + caught_signal)
+
+
+def setup_logger():
+    """
+    Attaches console handler and a queue handler to LOG. Console output is written directly, so it always appears
+    before any following prompt. File records are queued and written by a background listener, so logging calls don't
+    wait for file I/O. The listener is drained and stopped at exit.
+    @return: started listener
+    """
+    logging.basicConfig(format=LOGGER_FORMAT)
+    # LOGGER_FORMAT doesn't use caller information, so skip looking up the caller's frame for every record
+    logging._srcfile = None  # pylint: disable=protected-access
+    formatter = LogFormatter()
+    # stderr stays line buffered: prompts and port forwarding messages must show up immediately
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setFormatter(formatter)
+    file_handler = BufferedFileHandler(LOG_FILE)
+    file_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    LOG.addHandler(console_handler)
+    LOG.addHandler(logging.handlers.QueueHandler(log_queue))
+    # LOG has its own console handler; propagating to root would print every record twice
+    LOG.propagate = False
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    # atexit handlers don't run when the process is killed by a signal
+    for termination_signal in (signal.SIGTERM, getattr(signal, "SIGHUP", None)):
+        if termination_signal is not None:
+            signal.signal(termination_signal, exit_on_signal)
+    return listener
 
 
 def check_cid(cluster_id):
@@ -78,10 +248,83 @@ def check_cid(cluster_id):
     return cluster_id
 
 
+def prefetch_files(paths):
+    """
+    Hints the kernel to read the given files into the page cache, so reading them later doesn't hit a cold cache.
+    Missing files are skipped. Does nothing on systems without posix_fadvise.
+    @param paths: paths of the files to prefetch
+    @return:
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for path in paths:
+        try:
+            file_descriptor = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(file_descriptor, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(file_descriptor)
+
+
 def expand_path(path):
     return os.path.expanduser(path) if path.startswith(FOLDER_START) else os.path.join(CONFIG_FOLDER, path)
 
 
+# Each action imports its module only once selected to keep startup fast.
+# pylint: disable=import-outside-toplevel,unused-argument,too-many-positional-arguments
+def run_list(providers, configurations, config_input, cluster_id, debug):
+    LOG.info("Action list selected")
+    from bibigrid.core.actions import list_clusters
+    return list_clusters.log_list(cluster_id, providers, LOG)
+
+
+def run_check(providers, configurations, config_input, cluster_id, debug):
+    LOG.info("Action check selected")
+    from bibigrid.core.actions import check
+    return check.check(configurations, providers, LOG)
+
+
+def run_create(providers, configurations, config_input, cluster_id, debug):
+    LOG.info("Action create selected")
+    from bibigrid.core.actions import create
+    creator = create.Create(providers=providers, configurations=configurations, log=LOG, debug=debug,
+                            config_path=config_input, cluster_id=cluster_id)
+    LOG.log(PRINT_LEVEL, "Creating a new cluster takes about 10 or more minutes depending on your cloud "
+                         "provider and your configuration. Please be patient.")
+    return creator.create()
+
+
+def run_terminate(providers, configurations, config_input, cluster_id, debug):
+    LOG.info("Action terminate selected")
+    from bibigrid.core.actions import terminate
+    return terminate.terminate(cluster_id=cluster_id, providers=providers, log=LOG, debug=debug)
+
+
+def run_ide(providers, configurations, config_input, cluster_id, debug):
+    LOG.info("Action ide selected")
+    from bibigrid.core.actions import ide
+    return ide.ide(cluster_id, providers[0], configurations[0], LOG)
+
+
+def run_update(providers, configurations, config_input, cluster_id, debug):
+    LOG.info("Action update selected")
+    from bibigrid.core.actions import create, update
+    creator = create.Create(providers=providers, configurations=configurations, log=LOG, debug=debug,
+                            config_path=config_input, cluster_id=cluster_id)
+    return update.update(creator, LOG)
+# pylint: enable=import-outside-toplevel,unused-argument,too-many-positional-arguments
+
+
+ACTIONS = {"create": run_create, "terminate": run_terminate, "list": run_list, "check": run_check, "ide": run_ide,
+           "update": run_update}
+# actions that fall back to the last created cluster if no cluster_id is given
+CLUSTER_ID_ACTIONS = {"terminate", "ide", "update"}
+
+
 def run_action(action, configurations, config_input, cluster_id, debug):
     """
     Executes passed action.
@@ -92,50 +335,26 @@ def run_action(action, configurations, config_input, cluster_id, debug):
     :param debug: mostly whether the cluster should be kept alive on failure
     :return:
     """
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
     exit_state = 0
 
     try:
+        # pylint: disable-next=import-outside-toplevel
+        from bibigrid.core.utility.handler import provider_handler
         providers = provider_handler.get_providers(configurations, LOG)
         if not providers:
             exit_state = 1
 
         if providers:
-            match action:
-                case 'list':
-                    LOG.info("Action list selected")
-                    exit_state = list_clusters.log_list(cluster_id, providers, LOG)
-                case 'check':
-                    LOG.info("Action check selected")
-                    exit_state = check.check(configurations, providers, LOG)
-                case 'create':
-                    LOG.info("Action create selected")
-                    creator = create.Create(providers=providers, configurations=configurations, log=LOG, debug=debug,
-                                            config_path=config_input, cluster_id=cluster_id)
-                    LOG.log(42,
-                            "Creating a new cluster takes about 10 or more minutes depending on your cloud "
-                            "provider and your configuration. Please be patient.")
-                    exit_state = creator.create()
-                case _:
-                    if not cluster_id:
-                        cluster_id = get_cluster_id_from_mem()
-                        LOG.info("No cid (cluster_id) specified. Defaulting to last created cluster: %s",
-                                 cluster_id or 'None found')
-                    if cluster_id:
-                        LOG.debug(f"CL Argument Cluster ID: {cluster_id}")
-                        match action:
-                            case 'terminate':
-                                LOG.info("Action terminate selected")
-                                exit_state = terminate.terminate(cluster_id=cluster_id, providers=providers, log=LOG,
-                                                                 debug=debug)
-                            case 'ide':
-                                LOG.info("Action ide selected")
-                                exit_state = ide.ide(cluster_id, providers[0], configurations[0], LOG)
-                            case 'update':
-                                LOG.info("Action update selected")
-                                creator = create.Create(providers=providers, configurations=configurations, log=LOG,
-                                                        debug=debug, config_path=config_input, cluster_id=cluster_id)
-                                exit_state = update.update(creator, LOG)
+            if action in CLUSTER_ID_ACTIONS:
+                if not cluster_id:
+                    cluster_id = get_cluster_id_from_mem()
+                    LOG.info("No cid (cluster_id) specified. Defaulting to last created cluster: %s",
+                             cluster_id or 'None found')
+                if cluster_id:
+                    LOG.debug("CL Argument Cluster ID: %s", cluster_id)
+            if cluster_id or action not in CLUSTER_ID_ACTIONS:
+                exit_state = ACTIONS[action](providers, configurations, config_input, cluster_id, debug)
 
             for provider in providers:
                 provider.close()
@@ -145,35 +364,34 @@ def run_action(action, configurations, config_input, cluster_id, debug):
         LOG.error("".join(traceback.format_exception(exc_type, exc_value, exc_traceback)))
         exit_state = 2
 
-    time_in_s = time.time() - start_time
-    LOG.log(42, f"--- {math.floor(time_in_s / 60)} minutes and {round(time_in_s % 60, 2)} seconds ---")
+    minutes, remaining_ns = divmod(time.monotonic_ns() - start_ns, 60_000_000_000)
+    LOG.log(PRINT_LEVEL, f"--- {minutes} minutes and {remaining_ns / 1e9:.2f} seconds ---")
     return exit_state
 
 
-# pylint: disable=no-value-for-parameter,too-many-positional-arguments
-@click.command(context_settings={"help_option_names": ['-h', '--help']})
-@click.version_option(version.__version__, "-V", "--version", prog_name=version.PROG_NAME, message=version.MESSAGE)
-@click.option("-v", "--verbose", count=True, help="Increases logging verbosity.")
-@click.option("-d", "--debug", is_flag=True,
-              help="Keeps cluster active even when crashing. Asks before shutdown. "
-                   "Offers termination after successful create.")
-@click.option("-i", "--config_input", type=click.Path(), required=True, help="Path to YAML configurations file.")
-@click.option("-di", "--default_config_input", type=click.Path(), default=DEFAULT_CONFIG_PATH,
-              help="Path to default YAML configurations file.")
-@click.option("-ei", "--enforced_config_input", type=click.Path(), default=ENFORCED_CONFIG_PATH,
-              help="Path to enforced YAML configurations file.")
-@click.option("-cid", "--cluster_id", help="Cluster id is needed for certain actions.")
-@click.argument('action',
-                type=click.Choice(['create', 'terminate', 'list', 'check', 'ide', 'update'], case_sensitive=False))
-def main(verbose, debug, config_input, default_config_input, enforced_config_input, cluster_id, action):
-    """Interprets command line for BiBiGrid."""
-    logging.basicConfig(format=LOGGER_FORMAT)
-    LOG.addHandler(logging.FileHandler("bibigrid.log"))
+def print_version(ctx, _, value):
+    """
+    Prints version information and exits. Eager, so it runs before any other parameter is processed.
+    @param ctx: click context
+    @param value: whether the version flag was given
+    @return:
+    """
+    if not value or ctx.resilient_parsing:
+        return
+    click.echo(version.MESSAGE, color=ctx.color)
+    ctx.exit()
 
+
+# pylint: disable-next=too-many-positional-arguments
+def interpret_command_line(verbose, debug, config_input, default_config_input, enforced_config_input, cluster_id,
+                           action):
+    """Interprets command line for BiBiGrid."""
+    setup_logger()
     set_logger_verbosity(verbose)
     config_input = expand_path(config_input)
     default_config_input = expand_path(default_config_input)
     enforced_config_input = expand_path(enforced_config_input)
+    prefetch_files([config_input, default_config_input, enforced_config_input, CLUSTER_MEMORY_PATH])
 
     if cluster_id:
         cluster_id = check_cid(cluster_id)
@@ -183,15 +401,42 @@ def main(verbose, debug, config_input, default_config_input, enforced_config_inp
     if not configurations:
         sys.exit(1)
 
-    configurations = configuration_handler.merge_configurations(
-        user_config=configurations,
-        default_config_path=default_config_input,
-        enforced_config_path=enforced_config_input,
-        log=LOG
-    )
+    # without default and enforced configuration merging would only copy the user configuration
+    if os.path.isfile(default_config_input) or os.path.isfile(enforced_config_input):
+        configurations = configuration_handler.merge_configurations(
+            user_config=configurations,
+            default_config_path=default_config_input,
+            enforced_config_path=enforced_config_input,
+            log=LOG
+        )
 
     sys.exit(run_action(action, configurations, config_input, cluster_id, debug))
 
 
+# built once at import instead of through click's decorator chain
+main = click.Command(
+    name="bibigrid",
+    callback=interpret_command_line,
+    help="Interprets command line for BiBiGrid.",
+    context_settings={"help_option_names": ['-h', '--help']},
+    params=[
+        click.Option(["-V", "--version"], is_flag=True, expose_value=False, is_eager=True, callback=print_version,
+                     help="Show the version and exit."),
+        click.Option(["-v", "--verbose"], count=True, help="Increases logging verbosity."),
+        click.Option(["-d", "--debug"], is_flag=True,
+                     help="Keeps cluster active even when crashing. Asks before shutdown. "
+                          "Offers termination after successful create."),
+        click.Option(["-i", "--config_input"], type=click.Path(), required=True,
+                     help="Path to YAML configurations file."),
+        click.Option(["-di", "--default_config_input"], type=click.Path(), default=DEFAULT_CONFIG_PATH,
+                     help="Path to default YAML configurations file."),
+        click.Option(["-ei", "--enforced_config_input"], type=click.Path(), default=ENFORCED_CONFIG_PATH,
+                     help="Path to enforced YAML configurations file."),
+        click.Option(["-cid", "--cluster_id"], help="Cluster id is needed for certain actions."),
+        click.Argument(["action"],
+                       type=click.Choice(list(ACTIONS), case_sensitive=False)),
+    ])
+
+
 if __name__ == '__main__':
     main()
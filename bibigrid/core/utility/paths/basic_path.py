@@ -25,3 +25,5 @@ KEY_FOLDER = os.path.join(CONFIG_FOLDER, "keys/")
 CLUSTER_MEMORY_FOLDER = KEY_FOLDER
 CLUSTER_MEMORY_FILE = ".bibigrid.mem"
 CLUSTER_MEMORY_PATH = os.path.join(CONFIG_FOLDER, CLUSTER_MEMORY_FILE)
+# json sidecar of the cluster memory file holding only the cluster_id; cheaper to read than the yaml
+CLUSTER_MEMORY_CACHE_PATH = CLUSTER_MEMORY_PATH + ".json"
@@ -2,9 +2,15 @@
 Modul to test startup
 """
 
+import json
+import logging
+import os
+import tempfile
 from unittest import TestCase
 from unittest.mock import Mock, patch, MagicMock
 
+from click.testing import CliRunner
+
 from bibigrid.core import startup
 
 
@@ -13,6 +19,9 @@ class TestStartup(TestCase):
     Class to test startup
     """
 
+    def setUp(self):
+        startup._CID_CACHE.clear()  # pylint: disable=protected-access
+
     @patch('bibigrid.core.utility.handler.provider_handler.get_providers')
     def test_provider_closing(self, mock_get_providers):
         provider = Mock
@@ -94,3 +103,87 @@ class TestStartup(TestCase):
         self.assertTrue(startup.run_action(action="ide", configurations=configurations, config_input="", cluster_id=21,
                                            debug=True) == 42)
         mock_ide.assert_called_with(21, provider_mock, {"test_key": "test_value"}, startup.LOG)
+
+    def test_get_cluster_id_from_mem_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mem_path = os.path.join(tmp_dir, ".bibigrid.mem")
+            cache_path = mem_path + ".json"
+            with open(mem_path, mode="w", encoding="UTF-8") as mem_file:
+                mem_file.write("cluster_id: abc\n")
+            with patch("bibigrid.core.startup.CLUSTER_MEMORY_PATH", mem_path), \
+                    patch("bibigrid.core.startup.CLUSTER_MEMORY_CACHE_PATH", cache_path):
+                self.assertEqual("abc", startup.get_cluster_id_from_mem())
+                self.assertTrue(os.path.isfile(cache_path))
+                # forget the memoized result, so the second call has to read the json cache
+                startup._CID_CACHE.clear()  # pylint: disable=protected-access
+                with patch("bibigrid.core.startup.yaml.load") as mock_load:
+                    self.assertEqual("abc", startup.get_cluster_id_from_mem())
+                    mock_load.assert_not_called()
+
+    def test_get_cluster_id_from_mem_memoized(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mem_path = os.path.join(tmp_dir, ".bibigrid.mem")
+            with open(mem_path, mode="w", encoding="UTF-8") as mem_file:
+                mem_file.write("cluster_id: abc\n")
+            with patch("bibigrid.core.startup.CLUSTER_MEMORY_PATH", mem_path), \
+                    patch("bibigrid.core.startup.read_cluster_id_cache", return_value="abc") as mock_read_cache:
+                self.assertEqual("abc", startup.get_cluster_id_from_mem())
+                self.assertEqual("abc", startup.get_cluster_id_from_mem())
+                mock_read_cache.assert_called_once()
+
+    def test_buffered_file_handler(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_path = os.path.join(tmp_dir, "bibigrid.log")
+            handler = startup.BufferedFileHandler(log_path)
+            handler.emit(logging.makeLogRecord({"msg": "info", "levelno": logging.INFO}))
+            self.assertEqual(0, os.path.getsize(log_path))
+            handler.emit(logging.makeLogRecord({"msg": "warning", "levelno": logging.WARNING}))
+            with open(log_path, mode="r", encoding="UTF-8") as log_file:
+                self.assertEqual("info\nwarning\n", log_file.read())
+            handler.close()
+
+    @patch("bibigrid.core.utility.handler.configuration_handler.read_configuration")
+    def test_version_skips_configuration(self, mock_read_configuration):
+        result = CliRunner().invoke(startup.main, ["--version"])
+        self.assertEqual(0, result.exit_code)
+        self.assertIn(startup.version.__version__, result.output)
+        mock_read_configuration.assert_not_called()
+
+    def test_log_formatter(self):
+        record = logging.makeLogRecord({"msg": "cluster %s", "args": ("abc",), "levelname": "INFO"})
+        self.assertEqual(logging.Formatter(startup.LOGGER_FORMAT).format(record),
+                         startup.LogFormatter().format(record))
+
+    def test_get_cluster_id_from_mem_too_large(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mem_path = os.path.join(tmp_dir, ".bibigrid.mem")
+            with open(mem_path, mode="w", encoding="UTF-8") as mem_file:
+                mem_file.write("cluster_id: abc\n")
+                mem_file.write("#" * startup.MAX_CLUSTER_MEMORY_SIZE)
+            with patch("bibigrid.core.startup.CLUSTER_MEMORY_PATH", mem_path):
+                self.assertIsNone(startup.get_cluster_id_from_mem())
+
+    def test_buffered_file_handler_reopens(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_path = os.path.join(tmp_dir, "bibigrid.log")
+            handler = startup.BufferedFileHandler(log_path)
+            handler.emit(logging.makeLogRecord({"msg": "print", "levelno": startup.PRINT_LEVEL}))
+            self.assertEqual(0, os.path.getsize(log_path))
+            handler.close()
+            handler.emit(logging.makeLogRecord({"msg": "after close", "levelno": logging.INFO}))
+            handler.close()
+            with open(log_path, mode="r", encoding="UTF-8") as log_file:
+                self.assertEqual("print\nafter close\n", log_file.read())
+
+    def test_get_cluster_id_from_mem_stale_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mem_path = os.path.join(tmp_dir, ".bibigrid.mem")
+            cache_path = mem_path + ".json"
+            with open(mem_path, mode="w", encoding="UTF-8") as mem_file:
+                mem_file.write("cluster_id: def\n")
+            # cache newer than the memory file, but written for another version of it
+            with open(cache_path, mode="w", encoding="UTF-8") as cache_file:
+                json.dump({"cluster_id": "abc", "mtime_ns": 0, "size": 0}, cache_file)
+            with patch("bibigrid.core.startup.CLUSTER_MEMORY_PATH", mem_path), \
+                    patch("bibigrid.core.startup.CLUSTER_MEMORY_CACHE_PATH", cache_path):
+                self.assertEqual("def", startup.get_cluster_id_from_mem())